@@ -110,6 +110,7 @@ def write_ict(header_dict,data_dict,filepath,data_id,loc_id,date,rev,order=[],de
     """
     # module loads
     import numpy as np
+    import csv
     from datetime import datetime
     #from write_utils import merge_dicts
     # Should do input checking...
@@ -138,7 +139,7 @@ def write_ict(header_dict,data_dict,filepath,data_id,loc_id,date,rev,order=[],de
                 'date_y':date[:4],'date_m':date[4:6],'date_d':date[6:],
                 'now':datetime.now(),
                 'num_data':len(data_dict)-1, # remove one for the independent variable
-                'num_special_comments':len(header_dict['special_comments'].splitlines())}
+                'num_special_comments':header_dict['special_comments'].count('\n')+1 if header_dict['special_comments'] else 0}
     head = merge_dicts(def_dict,header_dict)
     
     # Compile the header information and verify some inputs
@@ -157,7 +158,7 @@ def write_ict(header_dict,data_dict,filepath,data_id,loc_id,date,rev,order=[],de
     Have the current revision identifier in the top place ***""")
         print('*** exiting, file not saved ***')
         return 
-    dnames = []
+    dnames,fmts = [],[]
     if not order:
         order = data_dict.keys()            
     for n in order:
@@ -172,6 +173,7 @@ def write_ict(header_dict,data_dict,filepath,data_id,loc_id,date,rev,order=[],de
             head['data_format'] = head['data_format']+',{:'+'{fmt}'.format(fmt=fmt)+'}'
             head['data_names'] = head['data_names']+','+n
             dnames.append(str(n))
+            fmts.append(fmt)
     try:
         head['support_info'] = """-----------------------------------------------------------------------------
 PI_CONTACT_INFO: {PI_contact}
@@ -197,7 +199,7 @@ REVISION: {rev}
         print('*** problem with header value of {v} ***'.format(v=v))
         print('*** exiting, file not saved ***')
         return
-    head['num_info'] = len(head['support_info'].splitlines())
+    head['num_info'] = head['support_info'].count('\n')+1
     try:
         head_str = """{nlines}, 1001
 {PI}
@@ -220,26 +222,28 @@ REVISION: {rev}
         print('*** exiting, file not saved ***')
         return
     
+    # check the data line format once on a dummy line, before writing anything
+    try:
+        head['data_format'].format(*[0.0]*len(dnames),t=0.0)
+    except (ValueError,IndexError,KeyError) as v:
+        print('*** problem with the data format {f}: {v} ***'.format(f=head['data_format'],v=v))
+        print('*** exiting, file not saved ***')
+        return
+    
     # Now open and write out the header and data to the file
+    # convert each data column to float once, and flag the missing and out of limit values on the whole column
+    cols = [np.array(data_dict[n]['data'],dtype=np.float64) for n in dnames]
+    for c in cols:
+        c[~np.isfinite(c)] = head['missing_val']
+        if not type(head['ULOD_value']) is str:
+            c[c>head['ULOD_value']] = head['ULOD_flag']
+        if not type(head['LLOD_value']) is str:
+            c[c<head['LLOD_value']] = head['LLOD_flag']
     with open(fname,'w') as f:
-        f.write(head_str.format(nlines=len(head_str.splitlines())))
+        f.write(head_str.format(nlines=head_str.count('\n'))) # head_str always ends with a newline
+        w = csv.writer(f,lineterminator='\n')
         for i,t in enumerate(data_dict[head['indep_var_name']]['data']):
-            dat = [] # build each line and run checks on the data
-            for n in dnames:
-                d = data_dict[n]['data'][i]
-                if not np.isfinite(d):
-                    d = head['missing_val']
-                if not type(head['ULOD_value']) is str:
-                    if d>head['ULOD_value']:
-                        d = head['ULOD_flag']
-                if not type(head['LLOD_value']) is str:
-                    if d<head['LLOD_value']:
-                        d = head['LLOD_flag']
-                dat.append(float(d))
-            try:
-                f.write(head['data_format'].format(*dat,t=t)+'\n')
-            except:
-                import pdb; pdb.set_trace()
+            w.writerow([format(t,'.0f')]+[format(c[i],fm) for c,fm in zip(cols,fmts)]) # build each line
     print('File writing successful to: {}'.format(fname))
     return
 
@@ -377,12 +381,12 @@ def prep_data_for_ict(data_dict,Start_UTC=None,End_UTC=None,
     
     # create the out_var_name array
     utc_out = np.arange(Start_UTC,End_UTC+1,time_interval)
-    data_out = data_dict.copy()
+    data_out = {}
     
     # now run through each data_dict variable to get the nearest neighbor
-    for n in data_out:
-        new = nearest_neighbor(utcs,data_out[n]['data'],utc_out,dist=time_interval/2.0)
-        data_out[n]['data'] = new
+    for n in data_dict:
+        new = nearest_neighbor(utcs,data_dict[n]['data'],utc_out,dist=time_interval/2.0)
+        data_out[n] = merge_dicts(data_dict[n],{'data':new})
     data_out[ov] = {'data':utc_out,'unit':'Seconds',
                     'long_description':'Time of measurement continuous starting from midnight UTC'}
     del(data_out[iv])
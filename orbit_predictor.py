@@ -25,10 +25,9 @@ Author:
 from datetime import datetime, timedelta
 import requests
 
-from geopy.distance import distance
 import numpy as np
 import pandas as pd
-import pvlib
+import pyproj
 import simplekml
 from simplekml import Style
 from skyfield.api import load, EarthSatellite, wgs84
@@ -68,6 +67,9 @@ satToColor = {
     "EARTHCARE": {'line':'darkgreen','poly':'azure'}
 }
 
+# WGS-84 ellipsoid for the footprint corner calculations
+GEOD = pyproj.Geod(ellps='WGS84')
+
 def fetch_latest_tle(sat="PACE"):
     """
     Fetch the latest TLE data for the PACE satellite.
@@ -150,7 +152,8 @@ def build_timestamps(start_datetime=None, time_resolution=1, time_length=1.0):
                          freq=f'{time_resolution}min')
 
 
-def predict_groundtrack(tle_lines, dates, satellite_name='PACE'):
+def predict_groundtrack(tle_lines, dates, satellite_name='PACE',
+                        satellite=None, ts=None):
     """
     Predict satellite orbital ground track from TLE data.
 
@@ -160,17 +163,30 @@ def predict_groundtrack(tle_lines, dates, satellite_name='PACE'):
         Two lines of TLE data.
     dates : list of DatetimeIndex
         List of dates for prediction.
+    satellite : EarthSatellite, optional
+        Satellite already built from tle_lines, to reuse across calls.
+    ts : Timescale, optional
+        Skyfield timescale to reuse across calls.
 
     Returns
     -------
     np.ndarray
         Predicted positions [latitude, longitude] in decimal degrees.
     """
-    satellite = EarthSatellite(tle_lines[0], tle_lines[1], satellite_name)
-    ts = load.timescale()
-
-    # Convert dates to skyfield times
-    t = ts.from_datetimes(dates)
+    if satellite is None:
+        satellite = EarthSatellite(tle_lines[0], tle_lines[1], satellite_name)
+    if ts is None:
+        ts = load.timescale(builtin=True)
+
+    # Convert dates to skyfield times from whole arrays of the UTC fields,
+    # rather than one datetime at a time
+    dates = pd.DatetimeIndex(dates)
+    if dates.tz is not None:
+        dates = dates.tz_convert('UTC')
+    t = ts.utc(dates.year.values, dates.month.values, dates.day.values,
+               dates.hour.values, dates.minute.values,
+               dates.second.values + dates.microsecond.values * 1e-6
+               + dates.nanosecond.values * 1e-9)
 
     # Calculate geocentric positions, then subpoints
     geocentric = satellite.at(t)
@@ -203,23 +219,79 @@ def calc_solar_zeniths(lat, lon, date):
     array
         Solar zenith angles in degrees.
     """
-    solar_position = pvlib.solarposition.get_solarposition(date, lat, lon)
-    return solar_position["zenith"].values
+    return solar_zenith_fast(lat, lon, date)
+
+
+def solar_zenith_fast(lat, lon, times):
+    """
+    Calculate solar zenith angles with the NOAA fractional year formulas.
+
+    Accurate to a fraction of a degree, which is plenty for the day/night
+    split, and computed directly on numpy arrays.
+
+    Parameters
+    ----------
+    lat : float or array-like
+        Latitude(s) in degrees.
+    lon : float or array-like
+        Longitude(s) in degrees.
+    times : datetime or array-like
+        Date(s) and time(s) of the observation, in UTC.
+
+    Returns
+    -------
+    array
+        Solar zenith angles in degrees.
+    """
+    # Split the times into day of year and hours with numpy datetime64
+    # arithmetic, which avoids the pandas per-field accessors
+    times = pd.DatetimeIndex(times if np.ndim(times) else [times])
+    if times.tz is not None:
+        times = times.tz_convert(None)
+    times = times.values.astype('datetime64[ns]')
+    days = times.astype('datetime64[D]')
+    years = times.astype('datetime64[Y]')
+    hours = (times - days) / np.timedelta64(1, 'h')
+    day_of_year = (days - years) / np.timedelta64(1, 'D')
+    days_in_year = ((years + 1).astype('datetime64[D]')
+                    - years.astype('datetime64[D]')) / np.timedelta64(1, 'D')
+
+    # Fractional year in radians
+    gamma = (2.0 * np.pi / days_in_year
+             * (day_of_year + (hours - 12.0) / 24.0))
+
+    # Equation of time in minutes and solar declination in radians
+    eqtime = 229.18 * (0.000075 + 0.001868 * np.cos(gamma)
+                       - 0.032077 * np.sin(gamma)
+                       - 0.014615 * np.cos(2 * gamma)
+                       - 0.040849 * np.sin(2 * gamma))
+    decl = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+            - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+            - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+
+    # Hour angle from the true solar time in minutes
+    true_solar_time = hours * 60.0 + eqtime + 4.0 * np.asarray(lon)
+    hour_angle = np.radians(true_solar_time / 4.0 - 180.0)
+
+    lat = np.radians(lat)
+    cos_zenith = (np.sin(lat) * np.sin(decl)
+                  + np.cos(lat) * np.cos(decl) * np.cos(hour_angle))
+    return np.degrees(np.arccos(np.clip(cos_zenith, -1.0, 1.0)))
 
 
 def calculate_headings(start_point, end_point):
     """
-    Calculate the headings between two points using numpy.
+    Calculate the headings between two points, or pairs of points, using numpy.
 
     Parameters
     ----------
-    start_point : tuple of latitude, longitude in decimal degrees
-        Start point for bearing calculation.
-    end_point : tuple of latitude, longitude in decimal degrees
-        End point for bearing calculation.
+    start_point : tuple or (N, 2) array of latitude, longitude in decimal degrees
+        Start point(s) for bearing calculation.
+    end_point : tuple or (N, 2) array of latitude, longitude in decimal degrees
+        End point(s) for bearing calculation.
     """
-    lat1, lon1 = np.radians(start_point)
-    lat2, lon2 = np.radians(end_point)
+    lat1, lon1 = np.radians(start_point).T
+    lat2, lon2 = np.radians(end_point).T
 
     delta_lon = lon2 - lon1
     x = np.sin(delta_lon) * np.cos(lat2)
@@ -245,29 +317,69 @@ def calculate_perpendicular_headings(bearing):
     return bearing1, bearing2
 
 
-def get_midpoint_headings(tle_lines, dates):
-    """Calculate midpoints and orthogonal headings for given dates.
+def calculate_destinations(points, headings, dist):
+    """
+    Calculate the points reached from start points along headings.
 
-    Calculates the midpoints using the TLE>ground_track script, then gives a
-    close point for a headings calculation to return the perpendicular headings
-    for footprint calculations.
+    Parameters
+    ----------
+    points : (N, 2) array of latitude, longitude in decimal degrees
+        Start points.
+    headings : array of float
+        Headings from each start point in decimal degrees.
+    dist : float
+        Distance travelled from each start point, in kilometers.
+
+    Returns
+    -------
+    np.ndarray
+        Destination points [latitude, longitude] in decimal degrees.
+    """
+    lons, lats, _ = GEOD.fwd(points[:, 1], points[:, 0], headings,
+                             np.full(len(points), dist * 1000.0))
+    return np.column_stack((lats, lons))
+
+
+def build_midpoint_timestamps(dates):
+    """
+    List the midpoint times between dates, each followed by a close offset.
+
+    Parameters
+    ----------
+    dates : DatetimeIndex
+        Timestamps for groundtrack positions.
+
+    Returns
+    -------
+    DatetimeIndex
+        Midpoint times, each paired with the same time plus 10 ms for
+        headings calculations.
     """
     midpoint_dates = dates[:-1] + (dates[1:] - dates[:-1]) / 2
 
     # Get small time offsets, then tile through the midpoint times
     offsets = np.array([np.timedelta64(0, 's'),
                         pd.Timedelta(milliseconds=10).to_timedelta64()])
-    expanded_dates = pd.DatetimeIndex(np.repeat(midpoint_dates.values, 2)
-                                      + np.tile(offsets, len(midpoint_dates)),
-                                      tz="UTC")
-    midpoints = predict_groundtrack(tle_lines, expanded_dates)
+    return pd.DatetimeIndex(np.repeat(midpoint_dates.values, 2)
+                            + np.tile(offsets, len(midpoint_dates)),
+                            tz="UTC")
+
+
+def get_midpoint_headings(tle_lines, dates, midpoints=None):
+    """Calculate midpoints and orthogonal headings for given dates.
+
+    Calculates the midpoints using the TLE>ground_track script, then gives a
+    close point for a headings calculation to return the perpendicular headings
+    for footprint calculations. If midpoints were already predicted at
+    build_midpoint_timestamps(dates), pass them to skip the prediction.
+    """
+    if midpoints is None:
+        midpoints = predict_groundtrack(tle_lines,
+                                        build_midpoint_timestamps(dates))
 
-    # Reshape and put all pairs together as a list
+    # Reshape into pairs and get all the headings at once
     midpoints_rs = midpoints.reshape((-1, 2, 2))
-    midpoint_pairs = [[tuple(subarr[0]), tuple(subarr[1])]
-                      for subarr in midpoints_rs]
-    headings = np.array([calculate_headings(start_point, end_point)
-                         for start_point, end_point in midpoint_pairs])
+    headings = calculate_headings(midpoints_rs[:, 0, :], midpoints_rs[:, 1, :])
 
     # Organize output
     midpoints = midpoints_rs[:, 0, :]
@@ -275,7 +387,7 @@ def get_midpoint_headings(tle_lines, dates):
     return midpoints, heading_right, heading_left
 
 
-def predict_footprint(tle_lines, dates, swath=50):
+def predict_footprint(tle_lines, dates, swath=50, satellite=None, ts=None):
     """
     Calculate polygon corners around ground track with footprint.
 
@@ -289,60 +401,60 @@ def predict_footprint(tle_lines, dates, swath=50):
         List of dates for prediction.
     swath : int, default 50
         Viewing footprint of satellite, in kilometers.
+    satellite, ts : optional
+        EarthSatellite and skyfield timescale passed on to predict_groundtrack.
     """
-    # Get groundtrack points for middle of footprint polygons
-    predicted_positions = predict_groundtrack(tle_lines, dates)
+    # Get groundtrack points for middle of footprint polygons and the points
+    # between them in a single prediction
+    subpoints = predict_groundtrack(
+        tle_lines, dates.append(build_midpoint_timestamps(dates)),
+        satellite=satellite, ts=ts)
+    predicted_positions = subpoints[:len(dates)]
 
     # Get points between groundtrack positions as well as headings
-    track_points, head_cw, head_ccw = get_midpoint_headings(tle_lines, dates)
+    track_points, head_cw, head_ccw = get_midpoint_headings(
+        tle_lines, dates, midpoints=subpoints[len(dates):])
 
     # Put together center point and boundaries
-    polygon1 = []
-    for idx, begin_point in enumerate(track_points[:-1]):
-        # To clarify: pred_pos[idx-1] > begin_point > pred_pos[idx] > end_point
-        end_point = track_points[idx + 1]
-        head_cw_begin = head_cw[idx - 1]
-        head_ccw_begin = head_ccw[idx - 1]
-        head_cw_end = head_cw[idx]
-        head_ccw_end = head_ccw[idx]
-
-        # Calculate the boundary points
-        if not hasattr(swath, '__len__'):
-            dist1 = distance(kilometers=swath)
-            dist2 = distance(kilometers=swath)
-        else:
-            dist1 = distance(kilometers=swath[0])
-            dist2 = distance(kilometers=swath[1])
-        
-        point1 = dist1.destination(
-            (begin_point[0], begin_point[1]), head_ccw_begin)
-        point2 = dist2.destination(
-            (begin_point[0], begin_point[1]), head_cw_begin)
-        point3 = dist2.destination(
-            (end_point[0], end_point[1]), head_cw_end)
-        point4 = dist1.destination(
-            (end_point[0], end_point[1]), head_ccw_end)
-
-        # Append the four points as a list of tuples
-        polygon1.append([
-            (point1.latitude, point1.longitude),
-            (point2.latitude, point2.longitude),
-            (point3.latitude, point3.longitude),
-            (point4.latitude, point4.longitude)
-        ])
+    # To clarify: pred_pos[idx-1] > begin_point > pred_pos[idx] > end_point
+    begin_points = track_points[:-1]
+    end_points = track_points[1:]
+    head_cw_begin = np.roll(head_cw, 1)[:-1]
+    head_ccw_begin = np.roll(head_ccw, 1)[:-1]
+    head_cw_end = head_cw[:-1]
+    head_ccw_end = head_ccw[:-1]
+
+    # Calculate the boundary points
+    if not hasattr(swath, '__len__'):
+        dist1 = dist2 = swath
+    else:
+        dist1, dist2 = swath[0], swath[1]
+
+    point1 = calculate_destinations(begin_points, head_ccw_begin, dist1)
+    point2 = calculate_destinations(begin_points, head_cw_begin, dist2)
+    point3 = calculate_destinations(end_points, head_cw_end, dist2)
+    point4 = calculate_destinations(end_points, head_ccw_end, dist1)
+
+    # Stack the four corners of each polygon
+    polygon1 = np.stack([point1, point2, point3, point4], axis=1)
     return predicted_positions[1:-1], track_points, polygon1
 
 
 def create_kml(dates, predicted_positions, track_points, boundary_points,
-               filename="../static/kml/satellite_orbit.kml",poly_color='red',line_color='black'):
+               filename="../static/kml/satellite_orbit.kml",poly_color='red',line_color='black',
+               solar_zeniths=None):
     """
     Create a KML document based on timestamps, groundtrack, and polygon bounds.
 
+    Solar zeniths of the predicted positions can be passed in if already
+    calculated, otherwise they are calculated here.
+
     TODO: Figure out the bug with crossing the Antimeridian.
     """
     # Get solar zeniths to skip nighttime data
-    solar_zeniths = calc_solar_zeniths(
-        predicted_positions[:, 0], predicted_positions[:, 1], dates[1:-1])
+    if solar_zeniths is None:
+        solar_zeniths = calc_solar_zeniths(
+            predicted_positions[:, 0], predicted_positions[:, 1], dates[1:-1])
 
     # Open KML and set up folders
     kml = simplekml.Kml()
@@ -366,12 +478,18 @@ def create_kml(dates, predicted_positions, track_points, boundary_points,
     point_style.iconstyle.hotspot = simplekml.HotSpot(x=50, xunits="fraction")
     point_style.labelstyle.scale = 1.5
 
-    for idx, predicted_position in enumerate(predicted_positions):
-        if solar_zeniths[idx] > 90:  # Skip nighttime
-            continue
+    # Flag daytime points, and the lines and polygons not crossing the
+    # Antimeridian, for all points at once
+    boundary_points = np.asarray(boundary_points)
+    day_idx = np.where(~(solar_zeniths > 90))[0]  # Skip nighttime
+    line_ok = np.abs(np.diff(track_points[:, 1])) < 90
+    poly_ok = np.ptp(boundary_points[:, :, 1], axis=1) < 90
+
+    for idx in day_idx:
+        predicted_position = predicted_positions[idx]
 
         # Add the LineString for the satellite orbit
-        if abs(track_points[idx, 1] - track_points[idx+1, 1]) < 90:
+        if line_ok[idx]:
             sat_line = multilin.newlinestring(
                 name="Satellite Ground Track",
                 coords=[np.flipud(track_points[idx]),
@@ -380,8 +498,7 @@ def create_kml(dates, predicted_positions, track_points, boundary_points,
             sat_line.style = line_style
 
         # Add the Polygon for the boundary box
-        lons_poly = [pt[1] for pt in boundary_points[idx]]
-        if max(lons_poly) - min(lons_poly) < 90:
+        if poly_ok[idx]:
             sat_polygon = multipoly.newpolygon(
                 name="Footprint",
                 outerboundaryis=([(pt[1], pt[0])
@@ -404,21 +521,42 @@ def main(satellite="EARTHCARE", num_days=1,start_date=[2024,7,22],number_of_loop
     # Fetch latest TLE for PACE
     tle_lines = fetch_latest_tle(sat=satellite)
 
-    # Generate dates for prediction (every 1 minutes for the next 3 days)
+    # Build the satellite and timescale once for all the loops
+    earth_sat = EarthSatellite(tle_lines[0], tle_lines[1], satellite)
+    ts = load.timescale(builtin=True)
+
+    # Generate dates for prediction (every 1 minutes) spanning all the loops
+    start_dt = datetime(start_date[0],start_date[1],start_date[2])
+    time_resolution = 1
+    steps_per_day = int(24*60/time_resolution)
+    all_dates = build_timestamps(start_datetime=start_dt,
+                                 time_resolution=time_resolution,
+                                 time_length=number_of_loops-1+num_days)
+
+    # Calculate the satellite positions, footprint points and solar zeniths
+    # once for all the loops
+    all_positions, all_track_points, all_boundary_points = predict_footprint(
+        tle_lines, all_dates, swath=satToSwath[satellite],
+        satellite=earth_sat, ts=ts)
+    all_zeniths = calc_solar_zeniths(
+        all_positions[:, 0], all_positions[:, 1], all_dates[1:-1])
+
     for i in range(number_of_loops):
-        dt = datetime(start_date[0],start_date[1],start_date[2])+timedelta(days=i)
-        dates = build_timestamps(start_datetime=dt,
-                                 time_resolution=1,
-                                 time_length=num_days)
+        dt = start_dt+timedelta(days=i)
 
-        # Calculate the satellite positions and footprint points
-        predicted_positions, track_points, boundary_points = predict_footprint(
-            tle_lines, dates, swath=satToSwath[satellite])
+        # Slice out the dates and points of this loop
+        i0 = i*steps_per_day
+        ndates = int(num_days*steps_per_day)+2
+        dates = all_dates[i0:i0+ndates]
+        predicted_positions = all_positions[i0:i0+ndates-2]
+        track_points = all_track_points[i0:i0+ndates-1]
+        boundary_points = all_boundary_points[i0:i0+ndates-2]
 
         # Create the KML file
         create_kml(dates, predicted_positions, track_points, boundary_points,
                    "{path}{satellite}_{y:04}{m:02}{d:02}.kml".format(satellite=satellite,y=dt.year,m=dt.month,d=dt.day,path=path),
-                   poly_color=satToColor[satellite]['poly'],line_color=satToColor[satellite]['line'])
+                   poly_color=satToColor[satellite]['poly'],line_color=satToColor[satellite]['line'],
+                   solar_zeniths=all_zeniths[i0:i0+ndates-2])
         print("Making kml file for: {path}{satellite}_{y:04}{m:02}{d:02}.kml".format(satellite=satellite,y=dt.year,m=dt.month,d=dt.day,path=path))
 
 def automated(path='./'):